@@ -1,9 +1,35 @@
+import asyncio
+import functools
 import csv, json, re, os, time, sys
+import gc
+import hashlib
 from pathlib import Path
 from urllib.parse import quote
 from datetime import datetime
 import shutil
 import requests
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# aiohttp is the preferred transport; fall back to a requests thread pool
+# if the deployment only pins requests
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# orjson parses and serializes JSON several times faster than stdlib;
+# keep stdlib json as a drop-in fallback so the script runs without it
+try:
+    import orjson
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+    _loads = orjson.loads
+except ImportError:
+    _dumps = json.dumps
+    _loads = json.loads
 
 # Try to load .env file if python-dotenv is available
 try:
@@ -39,42 +65,107 @@ HEADERS = {
     "x-rapidapi-host": "exercisedb-api1.p.rapidapi.com",  # Updated host
 }
 
+# One pooled session for every sync request: keeps the TCP+TLS connection to
+# RapidAPI alive across calls, negotiates gzip, and retries transient errors
+# with back-off so callers don't need per-call retry logic
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.headers["Accept-Encoding"] = "gzip, deflate"
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504]),
+))
+
 OUT = Path("exercisedb_staging_export")
 OUT.mkdir(exist_ok=True)
 
+# Re-runs during iteration used to refetch every response. Successful (200)
+# bodies are cached on disk for a day, keyed by (url, params), so a second
+# run pays zero network cost. Pass --refresh to force refetching.
+CACHE_DIR = OUT / "http_cache"
+CACHE_DIR.mkdir(exist_ok=True)
+CACHE_TTL = 86400  # seconds
+REFRESH = "--refresh" in sys.argv
+
+def _cache_path(url: str, params: dict) -> Path:
+    key = f"{url}?{sorted(params.items())}"
+    return CACHE_DIR / (hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+def _cache_get(url: str, params: dict):
+    if REFRESH:
+        return None
+    path = _cache_path(url, params)
+    try:
+        if time.time() - path.stat().st_mtime < CACHE_TTL:
+            return path.read_bytes()
+    except OSError:
+        pass
+    return None
+
+def _cache_put(url: str, params: dict, body: bytes):
+    try:
+        _cache_path(url, params).write_bytes(body)
+    except OSError:
+        pass
+
+_SLUG_RE = re.compile(r'[^a-z0-9]+')
+
 def slugify(s: str) -> str:
-    return re.sub(r'[^a-z0-9]+', '-', s.lower()).strip('-')[:64]
+    return _SLUG_RE.sub('-', s.lower()).strip('-')[:64]
+
+# Map ExerciseDB equipment → your tokens.
+# Exact matches that short-circuit straight to bodyweight
+_BW_SET = frozenset({"body weight", "bodyweight"})
+# Substring rules compiled once, checked in priority order (first hit wins,
+# mirroring the old if/elif chain)
+EQUIP_RULES = [
+    (re.compile(r"dumbbell"), "db"),
+    (re.compile(r"kettlebell"), "kb"),
+    (re.compile(r"barbell|smith|trap bar|ez bar"), "barbell"),
+    (re.compile(r"band"), "band"),
+    (re.compile(r"bench"), "bench"),
+    (re.compile(r"step|box"), "step"),
+    (re.compile(r"cable"), "cable"),
+    (re.compile(r"machine|leverage"), "machine"),
+    (re.compile(r"bike|ergometer"), "bike"),
+    (re.compile(r"tread"), "treadmill"),
+    (re.compile(r"sled"), "sled"),
+]
 
-# Map ExerciseDB equipment → your tokens
 def norm_equipment(equip_str: str):
     n = (equip_str or "").strip().lower()
-    if n in ("body weight","bodyweight"): return ["bodyweight"]
-    if "dumbbell" in n: return ["db"]
-    if "kettlebell" in n: return ["kb"]
-    if "barbell" in n or "smith" in n or "trap bar" in n or "ez bar" in n: return ["barbell"]
-    if "band" in n or "resistance band" in n: return ["band"]
-    if "bench" in n: return ["bench"]
-    if "step" in n or "box" in n: return ["step"]
-    if "cable" in n: return ["cable"]
-    if "machine" in n or "leverage" in n: return ["machine"]
-    if "bike" in n or "ergometer" in n: return ["bike"]
-    if "tread" in n: return ["treadmill"]
-    if "sled" in n: return ["sled"]
-    # catch-alls
-    if n in ("assisted","roller","rope","medicine ball","bosu ball","hammer","wheel roller"):
-        return ["bodyweight"]  # treat as accessory/bodyweight for now
+    if n in _BW_SET:
+        return ["bodyweight"]
+    for pat, tok in EQUIP_RULES:
+        if pat.search(n):
+            return [tok]
+    # catch-all: unknown/accessory equipment is treated as bodyweight for now
     return ["bodyweight"]
 
+# Equipment strings repeat massively across exercises (~12 distinct token sets),
+# so memoize the normalize+serialize step instead of re-dumping per row
+@functools.lru_cache(maxsize=64)
+def _equip_json(equip_str: str) -> str:
+    return _dumps(norm_equipment(equip_str))
+
+# The seven TODO list fields are always empty at export time
+_EMPTY_JSON_LIST = "[]"
+
+# CSV spelling for the three inferred boolean flags — one dict lookup per
+# field instead of str(bool).lower() allocating a new string per row
+_BOOL_STR = {True: "true", False: "false"}
+
 def get_equipment_types():
     """Fetch all available equipment types from the API"""
     url = f"{BASE}/api/v1/equipments"
     print(f"Fetching equipment types from: {url}")
     
     try:
-        r = requests.get(url, headers=HEADERS, timeout=60)
+        r = SESSION.get(url, timeout=60)
         r.raise_for_status()
         
-        data = r.json()
+        data = _loads(r.content)
         # Handle different response formats
         if isinstance(data, list):
             equipment_list = data
@@ -125,17 +216,14 @@ def parse_exercise_response(data):
             return [data]
     return []
 
-def get_all_exercises():
-    """
-    Use diverse search strategies to get comprehensive exercise coverage across
-    all equipment types, body parts, and exercise types.
-    """
-    all_exercises = []
-    seen_ids = set()  # To avoid duplicates
-    
-    # Strategy: Use diverse searches targeting different dimensions
-    # Mix of equipment, body parts, exercise types, and broad terms
-    search_strategies = [
+# Keep this many requests in flight at once. The semaphore bounds concurrency,
+# not request rate — RapidAPI's per-second cap is absorbed by retrying 429s
+# with backoff in the fetchers rather than by pacing each request.
+CONCURRENCY = 8
+
+# Strategy: Use diverse searches targeting different dimensions
+# Mix of equipment, body parts, exercise types, and broad terms
+SEARCH_STRATEGIES = [
         # First, try to get all without filters (if API supports it)
         {"params": {"limit": 2000}, "desc": "All exercises (no filter)"},
         {"params": {"limit": 5000}, "desc": "All exercises (high limit)"},
@@ -179,107 +267,204 @@ def get_all_exercises():
         {"params": {"keywords": "exercise", "limit": 1000}, "desc": "Broad 'exercise'"},
         {"params": {"keywords": "workout", "limit": 1000}, "desc": "Workout"},
     ]
-    
-    print(f"Fetching exercises using {len(search_strategies)} diverse search strategies...\n")
-    
-    for i, strategy in enumerate(search_strategies, 1):
+
+async def fetch_strategy(session, sem, strategy):
+    """Fetch one search strategy; returns (status, reason, body_bytes).
+
+    Retries 429/5xx and connection errors with backoff, mirroring the
+    urllib3 Retry mounted on SESSION so this path is no lossier than the
+    threaded fallback.
+    """
+    url = f"{BASE}/api/v1/exercises"
+    cached = _cache_get(url, strategy["params"])
+    if cached is not None:
+        return 200, "OK (cached)", cached
+    # aiohttp requires string param values
+    params = {k: str(v) for k, v in strategy["params"].items()}
+    status, reason, body = None, None, None
+    for attempt in range(4):
+        if attempt:
+            await asyncio.sleep(0.3 * (2 ** (attempt - 1)))
+        async with sem:
+            try:
+                async with session.get(url, params=params) as r:
+                    body = await r.read()
+                    status, reason = r.status, r.reason
+            except Exception as e:
+                status, reason, body = None, str(e), None
+                continue
+        if status == 200:
+            _cache_put(url, strategy["params"], body)
+            return status, reason, body
+        if status not in (429, 500, 502, 503, 504):
+            break
+    return status, reason, body
+
+async def _fetch_all_async(strategies):
+    """Fetch the given strategies concurrently over one aiohttp session."""
+    sem = asyncio.Semaphore(CONCURRENCY)
+    timeout = aiohttp.ClientTimeout(total=60)
+    async with aiohttp.ClientSession(headers=HEADERS, timeout=timeout) as session:
+        return await asyncio.gather(
+            *[fetch_strategy(session, sem, s) for s in strategies]
+        )
+
+def _fetch_sync(strategy):
+    """Fetch one strategy over the pooled SESSION; same tuple shape as fetch_strategy."""
+    url = f"{BASE}/api/v1/exercises"
+    cached = _cache_get(url, strategy["params"])
+    if cached is not None:
+        return 200, "OK (cached)", cached
+    try:
+        r = SESSION.get(url, params=strategy["params"], timeout=60)
+        if r.status_code == 200:
+            _cache_put(url, strategy["params"], r.content)
+        return r.status_code, r.reason, r.content
+    except Exception as e:
+        return None, str(e), None
+
+def _fetch_all_threaded(strategies):
+    """Drop-in for _fetch_all_async when aiohttp isn't installed.
+
+    Network I/O releases the GIL, so a thread pool over the pooled
+    module-level SESSION gets comparable concurrency.
+    """
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as ex:
+        # map preserves strategy order for the reporting pass
+        return list(ex.map(_fetch_sync, strategies))
+
+def _catalog_complete(status, body, params):
+    """True when the unfiltered probe returned fewer rows than its limit,
+    i.e. the API handed back its entire catalog in one response."""
+    if status != 200 or body is None:
+        return False
+    try:
+        exercises = parse_exercise_response(_loads(body))
+    except Exception:
+        return False
+    return 0 < len(exercises) < params.get("limit", 0)
+
+def get_all_exercises():
+    """
+    Use diverse search strategies to get comprehensive exercise coverage across
+    all equipment types, body parts, and exercise types.
+
+    All strategies are fetched concurrently (bounded by CONCURRENCY), then
+    deduplicated serially in strategy order.
+    """
+    # One dict does both jobs: membership check for dedup and insertion-ordered storage
+    exercises_by_id: dict = {}
+    # Summary sets are filled during ingest so no second full scan is needed
+    all_equipments = set()
+    all_body_parts = set()
+    all_exercise_types = set()
+
+    print(f"Fetching exercises using {len(SEARCH_STRATEGIES)} diverse search strategies...\n")
+
+    # Probe the unfiltered strategy first: if it returns fewer rows than its
+    # limit, the catalog is already complete and the remaining ~29 billable
+    # RapidAPI calls are pure waste.
+    first = SEARCH_STRATEGIES[0]
+    first_result = _fetch_sync(first)
+    if _catalog_complete(first_result[0], first_result[2], first["params"]):
+        print("✓ Unfiltered query returned the full catalog — skipping remaining strategies\n")
+        strategies = [first]
+        results = [first_result]
+    else:
+        strategies = SEARCH_STRATEGIES
+        if aiohttp is not None:
+            rest = asyncio.run(_fetch_all_async(SEARCH_STRATEGIES[1:]))
+        else:
+            rest = _fetch_all_threaded(SEARCH_STRATEGIES[1:])
+        results = [first_result] + rest
+
+    for i, (strategy, (status, reason, body)) in enumerate(zip(strategies, results), 1):
         params = strategy["params"]
         desc = strategy["desc"]
-        
+
         # Build description showing what we're searching for
         search_desc = ", ".join([f"{k}={v}" for k, v in params.items() if k != "limit"])
         if not search_desc:
             search_desc = "no filters"
-        
-        print(f"[{i}/{len(search_strategies)}] {desc} ({search_desc})")
-        
-        url = f"{BASE}/api/v1/exercises"
-        
-        try:
-            r = requests.get(url, headers=HEADERS, params=params, timeout=60)
-            
-            if r.status_code == 200:
-                data = r.json()
-                exercises = parse_exercise_response(data)
-                
-                # Add unique exercises by exerciseId (the API's ID field)
-                new_count = 0
-                for ex in exercises:
-                    # Try different ID field names
-                    ex_id = ex.get("exerciseId") or ex.get("id") or ex.get("_id") or str(ex)
-                    if ex_id not in seen_ids:
-                        seen_ids.add(ex_id)
-                        all_exercises.append(ex)
-                        new_count += 1
-                
-                # Show equipment variety in this batch
-                equipments_in_batch = set()
-                for ex in exercises:
+
+        print(f"[{i}/{len(strategies)}] {desc} ({search_desc})")
+
+        if status is None:
+            print(f"  ❌ Error: {reason}")
+            continue
+
+        if status == 200:
+            try:
+                data = _loads(body)
+            except Exception as e:
+                print(f"  ❌ Error parsing response: {e}")
+                continue
+            exercises = parse_exercise_response(data)
+
+            # Add unique exercises by exerciseId (the API's ID field)
+            before = len(exercises_by_id)
+            for ex in exercises:
+                # Try different ID field names
+                ex_id = ex.get("exerciseId") or ex.get("id") or ex.get("_id") or str(ex)
+                if ex_id not in exercises_by_id:
+                    exercises_by_id[ex_id] = ex
+
+                    # Collect summary stats for new exercises as we go
                     eq_list = ex.get("equipments") or ex.get("equipment") or []
                     if isinstance(eq_list, list):
-                        equipments_in_batch.update([str(e).upper() for e in eq_list])
-                    elif isinstance(eq_list, str):
-                        equipments_in_batch.add(eq_list.upper())
-                
-                equip_str = ", ".join(sorted(list(equipments_in_batch))[:5])
-                if len(equipments_in_batch) > 5:
-                    equip_str += f" (+{len(equipments_in_batch)-5} more)"
-                
-                print(f"  ✓ Got {len(exercises)} exercises ({new_count} new, total: {len(all_exercises)})")
-                if equipments_in_batch:
-                    print(f"     Equipment types: {equip_str}")
-                
-            elif r.status_code == 404:
-                print(f"  ⚠ Endpoint not found")
-            else:
-                print(f"  ❌ {r.status_code}: {r.reason}")
-                if r.status_code in [403, 400]:
-                    try:
-                        error_body = r.json()
-                        print(f"     Error: {error_body}")
-                    except:
-                        print(f"     Error text: {r.text[:200]}")
-            
-            time.sleep(0.3)  # Be polite with rate limits
-            
-        except Exception as e:
-            print(f"  ❌ Error: {e}")
-            continue
-    
-    # Show summary of equipment variety
-    if all_exercises:
-        all_equipments = set()
-        all_body_parts = set()
-        all_exercise_types = set()
-        
-        for ex in all_exercises:
-            # Collect equipment types
-            eq_list = ex.get("equipments") or ex.get("equipment") or []
-            if isinstance(eq_list, list):
-                all_equipments.update([str(e).upper() for e in eq_list if e])
-            elif isinstance(eq_list, str) and eq_list:
-                all_equipments.add(eq_list.upper())
-            
-            # Collect body parts
-            bp_list = ex.get("bodyParts") or ex.get("bodyParts") or []
-            if isinstance(bp_list, list):
-                all_body_parts.update([str(bp).upper() for bp in bp_list if bp])
-            elif isinstance(bp_list, str) and bp_list:
-                all_body_parts.add(bp_list.upper())
-            
-            # Collect exercise types
-            et = ex.get("exerciseType") or ex.get("type") or ""
-            if et:
-                all_exercise_types.add(str(et).upper())
-        
+                        all_equipments.update(map(str.upper, map(str, filter(None, eq_list))))
+                    elif isinstance(eq_list, str) and eq_list:
+                        all_equipments.add(eq_list.upper())
+
+                    bp_list = ex.get("bodyParts") or []
+                    if isinstance(bp_list, list):
+                        all_body_parts.update(map(str.upper, map(str, filter(None, bp_list))))
+                    elif isinstance(bp_list, str) and bp_list:
+                        all_body_parts.add(bp_list.upper())
+
+                    et = ex.get("exerciseType") or ex.get("type") or ""
+                    if et:
+                        all_exercise_types.add(str(et).upper())
+            new_count = len(exercises_by_id) - before
+
+            # Show equipment variety in this batch
+            equipments_in_batch = set()
+            for ex in exercises:
+                eq_list = ex.get("equipments") or ex.get("equipment") or []
+                if isinstance(eq_list, list):
+                    equipments_in_batch.update(map(str.upper, map(str, eq_list)))
+                elif isinstance(eq_list, str):
+                    equipments_in_batch.add(eq_list.upper())
+
+            equip_str = ", ".join(sorted(list(equipments_in_batch))[:5])
+            if len(equipments_in_batch) > 5:
+                equip_str += f" (+{len(equipments_in_batch)-5} more)"
+
+            print(f"  ✓ Got {len(exercises)} exercises ({new_count} new, total: {len(exercises_by_id)})")
+            if equipments_in_batch:
+                print(f"     Equipment types: {equip_str}")
+
+        elif status == 404:
+            print(f"  ⚠ Endpoint not found")
+        else:
+            print(f"  ❌ {status}: {reason}")
+            if status in [403, 400]:
+                try:
+                    error_body = _loads(body)
+                    print(f"     Error: {error_body}")
+                except:
+                    print(f"     Error text: {body[:200]}")
+
+    # Show summary of equipment variety (accumulated during ingest)
+    if exercises_by_id:
         print(f"\n📊 Summary:")
         print(f"   Equipment types: {len(all_equipments)} ({', '.join(sorted(list(all_equipments))[:10])}{'...' if len(all_equipments) > 10 else ''})")
         print(f"   Body parts: {len(all_body_parts)} ({', '.join(sorted(list(all_body_parts))[:10])}{'...' if len(all_body_parts) > 10 else ''})")
         print(f"   Exercise types: {len(all_exercise_types)} ({', '.join(sorted(list(all_exercise_types)))})")
-    
-    if all_exercises:
-        print(f"\n✓ Total unique exercises collected: {len(all_exercises)}")
-        return all_exercises
+
+    if exercises_by_id:
+        print(f"\n✓ Total unique exercises collected: {len(exercises_by_id)}")
+        return list(exercises_by_id.values())
     
     # If we get here, nothing worked
     print("\n❌ Failed to fetch exercises. Please check:")
@@ -288,112 +473,139 @@ def get_all_exercises():
     print("  3. Your API key has the correct permissions")
     raise Exception("Failed to fetch exercises from ExerciseDB API")
 
-def infer_pattern_from_exercise(name, body_parts, exercise_type):
-    """Infer pattern (category) from exercise name and metadata"""
-    name_lower = name.lower()
-    body_parts_lower = " ".join([str(bp).lower() for bp in body_parts]) if isinstance(body_parts, list) else str(body_parts).lower()
-    
+# Keyword lists for the infer_* helpers, compiled once at import time so each
+# helper does a single C-level scan of the (short) name instead of N substring
+# checks per call. Plain alternations (no \b) keep the original substring
+# matching semantics, e.g. "run" still matches "running".
+_CORE_KW = re.compile(r"core|abs|plank|crunch|sit-up")
+_MOBILITY_KW = re.compile(r"stretch|flexibility|mobility|yoga")
+_GOAL_MOBILITY_KW = re.compile(r"stretch|flexibility|mobility")
+_CARDIO_KW = re.compile(r"jump|run|sprint|cardio|hiit|burpee")
+_ENDURANCE_KW = re.compile(r"endurance|cardio")
+_ADVANCED_KW = re.compile(r"advanced|complex|plyometric|explosive|olympic")
+_BEGINNER_KW = re.compile(r"beginner|assisted|supported|wall|knee")
+_UNSAFE_IMPACT_KW = re.compile(r"jump|burpee|mountain climber|high knees|sprint|plyometric|explosive")
+_HEAVY_BINDING_UNSAFE_KW = re.compile(r"jumping[ -]jack|high[ -]knees|mountain[ -]climber|burpee|squat[ -]thrust")
+_PELVIC_UNSAFE_KW = re.compile(r"jump|sprint|explosive|plyometric|heavy|max")
+_BEARING_DOWN_KW = re.compile(r"crunch|sit-up|v-up")
+
+def infer_pattern_from_exercise(name_lower, bp_set, exercise_type_upper):
+    """Infer pattern (category) from pre-lowercased name and metadata"""
     # Core/abs exercises
-    if any(word in name_lower for word in ["core", "abs", "plank", "crunch", "sit-up"]):
+    if _CORE_KW.search(name_lower):
         return "core"
-    if "CORE" in body_parts_lower.upper() or "ABS" in body_parts_lower.upper():
+    if "CORE" in bp_set or "ABS" in bp_set:
         return "core"
-    
+
     # Mobility/flexibility
-    if any(word in name_lower for word in ["stretch", "flexibility", "mobility", "yoga"]):
+    if _MOBILITY_KW.search(name_lower):
         return "mobility"
-    if exercise_type and "STRETCH" in str(exercise_type).upper():
+    if "STRETCH" in exercise_type_upper:
         return "mobility"
-    
+
     # Cardio
-    if any(word in name_lower for word in ["jump", "run", "sprint", "cardio", "hiit", "burpee"]):
+    if _CARDIO_KW.search(name_lower):
         return "cardio"
-    if exercise_type and "CARDIO" in str(exercise_type).upper():
+    if "CARDIO" in exercise_type_upper:
         return "cardio"
-    
+
     # Default to strength
     return "strength"
 
-def infer_goal_from_exercise(name, body_parts, exercise_type):
+def infer_goal_from_exercise(name_lower):
     """Infer goal from exercise metadata"""
-    name_lower = name.lower()
-    
-    if any(word in name_lower for word in ["stretch", "flexibility", "mobility"]):
+    if _GOAL_MOBILITY_KW.search(name_lower):
         return "mobility"
-    if any(word in name_lower for word in ["endurance", "cardio"]):
+    if _ENDURANCE_KW.search(name_lower):
         return "endurance"
-    
+
     # Default to strength
     return "strength"
 
-def infer_difficulty_from_exercise(name, exercise_type):
+def infer_difficulty_from_exercise(name_lower):
     """Infer difficulty level from exercise name"""
-    name_lower = name.lower()
-    
     # Advanced indicators
-    if any(word in name_lower for word in ["advanced", "complex", "plyometric", "explosive", "olympic"]):
+    if _ADVANCED_KW.search(name_lower):
         return "advanced"
-    
+
     # Beginner indicators
-    if any(word in name_lower for word in ["beginner", "assisted", "supported", "wall", "knee"]):
+    if _BEGINNER_KW.search(name_lower):
         return "beginner"
-    
+
     # Default to intermediate
     return "intermediate"
 
-def infer_binder_safety(name, body_parts, exercise_type):
+def infer_binder_safety(name_lower, bp_set):
     """Infer binder safety from exercise characteristics"""
-    name_lower = name.lower()
-    body_parts_str = " ".join([str(bp).lower() for bp in body_parts]) if isinstance(body_parts, list) else str(body_parts).lower()
-    
     # High compression risk exercises
-    unsafe_keywords = ["jump", "burpee", "mountain climber", "high knees", "sprint", "plyometric", "explosive"]
-    if any(keyword in name_lower for keyword in unsafe_keywords):
+    if _UNSAFE_IMPACT_KW.search(name_lower):
         return False
-    
+
     # Chest-focused exercises might have compression
-    if "CHEST" in body_parts_str.upper() or "pectoral" in name_lower:
+    if "CHEST" in bp_set or "pectoral" in name_lower:
         # Most chest exercises are okay, but be cautious
         return True
-    
+
     # Generally safe
     return True
 
-def infer_heavy_binding_safety(name):
+def infer_heavy_binding_safety(name_lower):
     """Infer heavy binding safety - exercises that are NOT safe for heavy binding"""
-    name_lower = name.lower()
-    unsafe_patterns = ['jumping_jack', 'high_knees', 'mountain_climber', 'burpee', 'squat_thrust']
-    
-    for pattern in unsafe_patterns:
-        if pattern.replace('_', ' ') in name_lower or pattern.replace('_', '-') in name_lower:
-            return False
-    
-    return True
+    return not _HEAVY_BINDING_UNSAFE_KW.search(name_lower)
 
-def infer_pelvic_floor_safety(name, body_parts, exercise_type):
+def infer_pelvic_floor_safety(name_lower, bp_set):
     """Infer pelvic floor safety"""
-    name_lower = name.lower()
-    body_parts_str = " ".join([str(bp).lower() for bp in body_parts]) if isinstance(body_parts, list) else str(body_parts).lower()
-    
     # High impact/compression exercises
-    unsafe_keywords = ["jump", "sprint", "explosive", "plyometric", "heavy", "max"]
-    if any(keyword in name_lower for keyword in unsafe_keywords):
+    if _PELVIC_UNSAFE_KW.search(name_lower):
         return False
-    
+
     # Core exercises that involve bearing down
-    if "core" in name_lower or "CORE" in body_parts_str.upper():
+    if "core" in name_lower or "CORE" in bp_set:
         # Most core exercises are safe, but some require caution
-        if any(word in name_lower for word in ["crunch", "sit-up", "v-up"]):
+        if _BEARING_DOWN_KW.search(name_lower):
             return False  # These involve bearing down
-    
+
     return True
 
 data = get_all_exercises()
-rows = []
+
+# Strategies overlap heavily (e.g. "dumbbell" and "chest" both return dumbbell
+# bench press), so exact-ID dedup can still keep near-identical records under
+# different IDs. Collapse them by a (slug, equipment) content key — one set
+# probe per exercise, no pairwise comparisons.
+_seen_keys = set()
+_deduped = []
 for ex in data:
+    eq = ex.get("equipments") or ex.get("equipment") or []
+    if not isinstance(eq, list):
+        eq = [eq]
+    key = (slugify(ex.get("name", "")), frozenset(str(e) for e in eq if e))
+    if key not in _seen_keys:
+        _seen_keys.add(key)
+        _deduped.append(ex)
+if len(_deduped) < len(data):
+    print(f"✓ Collapsed {len(data) - len(_deduped)} near-duplicate exercises by (slug, equipment) key")
+data = _deduped
+
+@dataclass(slots=True)
+class ParsedEx:
+    """Normalized view of one raw API exercise record.
+
+    Built once per record so the row build and inference helpers read typed
+    attributes instead of re-running dict lookups and isinstance checks.
+    """
+    name: str
+    ex_id: str
+    equip_str: str
+    body_parts: list
+    target_muscles: list
+    exercise_type: str
+    thumb: str
+
+def parse_exercise(ex) -> ParsedEx:
+    """Do the shape normalization for one raw API dict, exactly once."""
     name = ex.get("name","").strip().title()
-    slug = slugify(name)
-    
+
     # Handle equipment - API returns equipments as array
     equip_list = ex.get("equipments") or ex.get("equipment") or []
     if isinstance(equip_list, list):
@@ -401,78 +613,88 @@ for ex in data:
         equip_str = ", ".join([str(e) for e in equip_list if e])
     else:
         equip_str = str(equip_list) if equip_list else ""
-    
-    equip_tokens = norm_equipment(equip_str)
-    
+
     # Handle image URL - API uses imageUrl
     thumb = ex.get("imageUrl") or ex.get("gifUrl") or ex.get("gif_url") or ex.get("image") or ""
-    
+
     # Handle ID - API uses exerciseId
     ex_id = ex.get("exerciseId") or ex.get("id") or ex.get("_id") or ""
-    source_url = f"https://exercisedb-api1.p.rapidapi.com/api/v1/exercises/{ex_id}" if ex_id else ""
-    
+
     # Extract additional useful fields from API
     body_parts_raw = ex.get("bodyParts") or []
     if not isinstance(body_parts_raw, list):
         body_parts_raw = [body_parts_raw] if body_parts_raw else []
-    
-    body_parts_str = ", ".join([str(bp) for bp in body_parts_raw if bp])
-    
+
     exercise_type = ex.get("exerciseType") or ""
     target_muscles_raw = ex.get("targetMuscles") or []
     if not isinstance(target_muscles_raw, list):
         target_muscles_raw = [target_muscles_raw] if target_muscles_raw else []
-    
-    target_muscles_str = ", ".join([str(tm) for tm in target_muscles_raw if tm])
-    
-    # Infer trans-specific fields with sensible defaults (pass list version)
-    pattern = infer_pattern_from_exercise(name, body_parts_raw, exercise_type)
-    goal = infer_goal_from_exercise(name, body_parts_raw, exercise_type)
-    difficulty = infer_difficulty_from_exercise(name, exercise_type)
-    binder_aware = infer_binder_safety(name, body_parts_raw, exercise_type)
-    heavy_binding_safe = infer_heavy_binding_safety(name)
-    pelvic_floor_safe = infer_pelvic_floor_safety(name, body_parts_raw, exercise_type)
-    
-    # Default values for fields that need manual curation
-    # These should be reviewed and filled in manually
-    contraindications = []  # TODO: Manual curation needed
-    cue_primary = ""  # TODO: Manual curation needed
-    cues = []  # TODO: Manual curation needed - can use target_muscles as starting point
-    breathing = ""  # TODO: Manual curation needed
-    coaching_points = []  # TODO: Manual curation needed
-    common_errors = []  # TODO: Manual curation needed
-    progressions = []  # TODO: Manual curation needed
-    regressions = []  # TODO: Manual curation needed
-    swaps = []  # TODO: Manual curation needed - exercise indices
-    
-    rows.append({
-        "slug": slug,
-        "name": name,
-        "pattern": pattern,
-        "goal": goal,
-        "equipment": json.dumps(equip_tokens),
-        "difficulty": difficulty,
-        "binder_aware": str(binder_aware).lower(),
-        "heavy_binding_safe": str(heavy_binding_safe).lower(),
-        "pelvic_floor_safe": str(pelvic_floor_safe).lower(),
-        "contraindications": json.dumps(contraindications),
-        "cue_primary": cue_primary,
-        "cues": json.dumps(cues),
-        "breathing": breathing,
-        "coaching_points": json.dumps(coaching_points),
-        "common_errors": json.dumps(common_errors),
-        "progressions": json.dumps(progressions),
-        "regressions": json.dumps(regressions),
-        "swaps": json.dumps(swaps),
+
+    return ParsedEx(
+        name=name,
+        ex_id=str(ex_id),
+        equip_str=equip_str,
+        body_parts=body_parts_raw,
+        target_muscles=target_muscles_raw,
+        exercise_type=exercise_type,
+        thumb=thumb,
+    )
+
+def build_row(p: ParsedEx) -> list:
+    """Transform one parsed exercise into a staging CSV row (csv_headers order)."""
+    slug = slugify(p.name)
+    source_url = f"https://exercisedb-api1.p.rapidapi.com/api/v1/exercises/{p.ex_id}" if p.ex_id else ""
+    body_parts_str = ", ".join([str(bp) for bp in p.body_parts if bp])
+    target_muscles_str = ", ".join([str(tm) for tm in p.target_muscles if tm])
+
+    # Normalize once per exercise; every infer_* helper reads these.
+    # bp_set gives the helpers O(1) membership checks instead of substring
+    # scans over a joined string.
+    name_lower = p.name.lower()
+    bp_set = frozenset(str(bp).upper() for bp in p.body_parts if bp)
+    exercise_type_upper = str(p.exercise_type).upper()
+
+    # Infer trans-specific fields with sensible defaults
+    pattern = infer_pattern_from_exercise(name_lower, bp_set, exercise_type_upper)
+    goal = infer_goal_from_exercise(name_lower)
+    difficulty = infer_difficulty_from_exercise(name_lower)
+    binder_aware = infer_binder_safety(name_lower, bp_set)
+    heavy_binding_safe = infer_heavy_binding_safety(name_lower)
+    pelvic_floor_safe = infer_pelvic_floor_safety(name_lower, bp_set)
+
+    # Curation fields (contraindications, cues, breathing, coaching points,
+    # errors, progressions, regressions, swaps) are exported empty —
+    # they need manual review; cues can use target_muscles as a starting point.
+    # Values are ordered to match csv_headers so the writer needs no
+    # per-row field lookup.
+    return [
+        slug,                           # slug
+        p.name,                         # name
+        pattern,                        # pattern
+        goal,                           # goal
+        _equip_json(p.equip_str),       # equipment
+        difficulty,                     # difficulty
+        _BOOL_STR[binder_aware],        # binder_aware
+        _BOOL_STR[heavy_binding_safe],  # heavy_binding_safe
+        _BOOL_STR[pelvic_floor_safe],   # pelvic_floor_safe
+        _EMPTY_JSON_LIST,               # contraindications
+        "",                             # cue_primary
+        _EMPTY_JSON_LIST,               # cues
+        "",                             # breathing
+        _EMPTY_JSON_LIST,               # coaching_points
+        _EMPTY_JSON_LIST,               # common_errors
+        _EMPTY_JSON_LIST,               # progressions
+        _EMPTY_JSON_LIST,               # regressions
+        _EMPTY_JSON_LIST,               # swaps
         # API metadata (for reference)
-        "body_parts": body_parts_str,
-        "exercise_type": exercise_type,
-        "target_muscles": target_muscles_str,
-        "media_thumb": thumb,
-        "media_video": "",
-        "source_url": source_url,
-        "external_id": str(ex_id),
-    })
+        body_parts_str,                 # body_parts
+        p.exercise_type,                # exercise_type
+        target_muscles_str,             # target_muscles
+        p.thumb,                        # media_thumb
+        "",                             # media_video
+        source_url,                     # source_url
+        p.ex_id,                        # external_id
+    ]
 
 csv_path = OUT / "staging_exercisedb.csv"
 
@@ -494,18 +716,34 @@ csv_headers = [
     "media_thumb", "media_video", "source_url", "external_id"
 ]
 
-with csv_path.open("w", newline="", encoding="utf-8") as f:
+# Stream each row straight to disk: transform -> encode -> write per record,
+# never materializing the full row list in memory. writerows consumes the
+# generator and does the header ordering in a single pass.
+# Write to a temp file and atomically swap it in so a crash mid-write never
+# leaves a half-populated staging CSV behind.
+tmp_path = csv_path.with_suffix(".csv.tmp")
+with tmp_path.open("w", newline="", encoding="utf-8") as f:
     w = csv.writer(f)
     w.writerow(csv_headers)
-    for r in rows:
-        w.writerow([r.get(header, "") for header in csv_headers])
+    # writerows is implemented in C and pulls rows straight off the generator
+    w.writerows(build_row(parse_exercise(ex)) for ex in data)
+os.replace(tmp_path, csv_path)
+
+total_written = len(data)
+
+# The raw API records (potentially thousands of nested dicts) are no longer
+# needed once the CSV is on disk — drop them so peak RSS doesn't stay at the
+# post-fetch high-water mark for the rest of the run
+del data, _deduped
+gc.collect()
+# build_row always ships the curation fields empty, so every exported row
+# still needs the manual pass
+needs_curation = total_written
 
-print(f"✓ Wrote {csv_path} with {len(rows)} rows.")
+print(f"✓ Wrote {csv_path} with {total_written} rows.")
 
-# Count exercises needing manual curation
-needs_curation = sum(1 for r in rows if not r.get("cues") or r.get("cues") == "[]")
 print(f"\n📝 Curation Status:")
-print(f"   Exercises with inferred values: {len(rows)}")
+print(f"   Exercises with inferred values: {total_written}")
 print(f"   Exercises needing manual cue/coaching curation: {needs_curation}")
 print(f"   ⚠️  Review and fill in: cues, breathing, coaching_points, common_errors, progressions, regressions, swaps")
 
@@ -513,7 +751,7 @@ print(f"   ⚠️  Review and fill in: cues, breathing, coaching_points, common_
 sql_content = f"""
 -- Staging table for ExerciseDB exercises with trans-specific fields
 -- Generated: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
--- Total exercises: {len(rows)}
+-- Total exercises: {total_written}
 -- 
 -- NOTE: Some fields are auto-inferred and should be reviewed:
 --   - difficulty, binder_aware, heavy_binding_safe, pelvic_floor_safe (auto-inferred)
@@ -558,7 +796,9 @@ CREATE TABLE IF NOT EXISTS staging_exercisedb (
 -- Note: For SQLite, you may need to parse the JSON equipment array differently
 """
 sql_path = OUT / "create_staging_exercisedb.sql"
-sql_path.write_text(sql_content)
+sql_tmp = sql_path.with_suffix(".sql.tmp")
+sql_tmp.write_text(sql_content)
+os.replace(sql_tmp, sql_path)
 print(f"✓ Generated SQL file: {sql_path}")
 print(f"\n📋 Next Steps:")
 print(f"   1. Review the CSV: {csv_path}")
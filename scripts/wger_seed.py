@@ -1,55 +1,205 @@
-import csv, json, time, re, hashlib
+import asyncio
+import functools
+import csv, json, logging, sys, time, re, hashlib
 from pathlib import Path
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# aiohttp lets us fetch pages concurrently; fall back to sequential requests
+# if it isn't installed
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# orjson parses and serializes JSON several times faster than stdlib;
+# stdlib json stays as a drop-in fallback
+try:
+    import orjson
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+    _loads = orjson.loads
+except ImportError:
+    _dumps = json.dumps
+    _loads = json.loads
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s", stream=sys.stderr)
+log = logging.getLogger(__name__)
 
 BASE = "https://wger.de/api/v2"
 OUT = Path("wger_staging_export")
 
 OUT.mkdir(exist_ok=True)
 
+# Re-runs used to refetch every equipment and exerciseinfo page. Successful
+# bodies are cached on disk for a day, keyed by URL, so a second run pays
+# zero network cost. Pass --refresh to force refetching. Same scheme as
+# exercisedb_seed, so both transports below share one cache.
+CACHE_DIR = OUT / "cache"
+CACHE_DIR.mkdir(exist_ok=True)
+CACHE_TTL = 86400  # seconds
+REFRESH = "--refresh" in sys.argv
+
+def _cache_path(url: str) -> Path:
+    return CACHE_DIR / (hashlib.sha256(url.encode()).hexdigest() + ".json")
+
+def _cache_get(url: str):
+    if REFRESH:
+        return None
+    path = _cache_path(url)
+    try:
+        if time.time() - path.stat().st_mtime < CACHE_TTL:
+            return path.read_bytes()
+    except OSError:
+        pass
+    return None
+
+def _cache_put(url: str, body: bytes):
+    try:
+        _cache_path(url).write_bytes(body)
+    except OSError:
+        pass
+
+PAGE_SIZE = 200
+CONCURRENCY = 8  # pages in flight at once; bounded to stay polite to wger
+
+# One pooled session for all sync calls: keep-alive skips a TCP+TLS
+# handshake per page, gzip shrinks the JSON, and pooled retries absorb
+# wger's occasional 5xx instead of aborting the run
+SESSION = requests.Session()
+SESSION.headers.update({
+    "Accept-Encoding": "gzip, deflate",
+    "User-Agent": "thf-seeder/1.0",
+})
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=10,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504]),
+))
+
+_SLUG_RX = re.compile(r'[^a-z0-9]+')
+
+# Exercise names repeat across variants ("bench press" etc.), so memoize
+@functools.lru_cache(maxsize=4096)
 def slugify(s: str) -> str:
-    return re.sub(r'[^a-z0-9]+', '-', s.lower()).strip('-')[:64]
+    return _SLUG_RX.sub('-', s.lower()).strip('-')[:64]
 
-# 1) Fetch full equipment list
+# 1) Fetch full equipment list (small — usually one page, so keep it serial)
 equip = {}
 url = f"{BASE}/equipment/?limit=200"
 while url:
-    r = requests.get(url, timeout=30)
-    r.raise_for_status()
-    data = r.json()
+    body = _cache_get(url)
+    if body is None:
+        r = SESSION.get(url, timeout=30)
+        r.raise_for_status()
+        body = r.content
+        _cache_put(url, body)
+    data = _loads(body)
     for row in data["results"]:
         equip[row["id"]] = row["name"].strip().lower()
     url = data.get("next")
 
-# 2) Normalization to your tokens
+# 2) Normalization to your tokens.
+# One combined regex replaces the old if/elif substring chain: the matched
+# group's name IS the token, so each equipment name costs a single C-level
+# scan. wger equipment names are atomic terms ("dumbbell", "bench", ...), so
+# leftmost-match is equivalent to the old rule order in practice.
+_EQUIP_RX = re.compile(
+    r"(?P<bodyweight>none|no equipment)"
+    r"|(?P<db>dumbbell|^db$)"
+    r"|(?P<kb>kettlebell|^kb$)"
+    r"|(?P<barbell>barbell)"
+    r"|(?P<band>band)"
+    r"|(?P<bench>bench)"
+    r"|(?P<step>step|box)"
+    r"|(?P<cable>cable)"
+    r"|(?P<machine>machine|leverage)"
+    r"|(?P<bike>bike|cycle|erg)"
+    r"|(?P<treadmill>tread)"
+    r"|(?P<sled>sled)"
+)
+
+# Takes a tuple so results memoize — equipment combos repeat massively
+@functools.lru_cache(maxsize=2048)
 def map_equipment(names):
     tokens = set()
     for name in names:
-        n = name.lower()
-        if n in ("none", "no equipment"): tokens.add("bodyweight")
-        elif "dumbbell" in n or n == "db": tokens.add("db")
-        elif "kettlebell" in n or n == "kb": tokens.add("kb")
-        elif "barbell" in n: tokens.add("barbell")
-        elif "band" in n or "resistance band" in n: tokens.add("band")
-        elif "bench" in n: tokens.add("bench")
-        elif "step" in n or "box" in n: tokens.add("step")
-        elif "cable" in n: tokens.add("cable")
-        elif "machine" in n or "leverage" in n: tokens.add("machine")
-        elif "bike" in n or "cycle" in n or "erg" in n: tokens.add("bike")
-        elif "tread" in n: tokens.add("treadmill")
-        elif "sled" in n: tokens.add("sled")
-        else:
-            # fallback: treat as bodyweight if unknown
-            tokens.add("bodyweight")
+        m = _EQUIP_RX.search(name.lower())
+        # fallback: treat as bodyweight if unknown
+        tokens.add(m.lastgroup if m else "bodyweight")
     return sorted(tokens)
 
-# 3) Fetch all English exercises using exerciseinfo endpoint
-exercises = []
-url = f"{BASE}/exerciseinfo/?limit=200&offset=0"
-while url:
-    r = requests.get(url, timeout=60)
+# 3) Fetch all English exercises using the exerciseinfo endpoint.
+# The first page is fetched synchronously to read the total count; the
+# remaining offsets are then fetched concurrently instead of walking the
+# "next" links one page (and one 0.3s sleep) at a time.
+def _page_url(offset: int) -> str:
+    return f"{BASE}/exerciseinfo/?limit={PAGE_SIZE}&offset={offset}"
+
+body = _cache_get(_page_url(0))
+if body is None:
+    r = SESSION.get(_page_url(0), timeout=60)
     r.raise_for_status()
-    data = r.json()
+    body = r.content
+    _cache_put(_page_url(0), body)
+first_page = _loads(body)
+count = first_page.get("count") or len(first_page.get("results", []))
+offsets = list(range(PAGE_SIZE, count, PAGE_SIZE))
+
+async def _fetch_pages_async(offsets):
+    sem = asyncio.Semaphore(CONCURRENCY)
+    timeout = aiohttp.ClientTimeout(total=60)
+
+    async def fetch(session, offset):
+        url = _page_url(offset)
+        body = _cache_get(url)
+        if body is not None:
+            return _loads(body)
+        # Retry 429/5xx and connection errors with backoff, mirroring the
+        # urllib3 Retry mounted on SESSION — without this, one throttled
+        # page would propagate out of asyncio.gather and kill the run
+        for attempt in range(4):
+            if attempt:
+                await asyncio.sleep(0.5 * (2 ** (attempt - 1)))
+            async with sem:
+                try:
+                    async with session.get(url) as resp:
+                        if resp.status in (429, 500, 502, 503, 504) and attempt < 3:
+                            continue
+                        resp.raise_for_status()
+                        body = await resp.read()
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                    if attempt == 3:
+                        raise
+                    continue
+            _cache_put(url, body)
+            return _loads(body)
+
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        return await asyncio.gather(*[fetch(session, o) for o in offsets])
+
+def _fetch_pages_sync(offsets):
+    pages = []
+    for offset in offsets:
+        url = _page_url(offset)
+        body = _cache_get(url)
+        if body is None:
+            r = SESSION.get(url, timeout=60)
+            r.raise_for_status()
+            body = r.content
+            _cache_put(url, body)
+            time.sleep(0.3)  # be polite (only when we actually hit the network)
+        pages.append(_loads(body))
+    return pages
+
+if aiohttp is not None and offsets:
+    pages = asyncio.run(_fetch_pages_async(offsets))
+else:
+    pages = _fetch_pages_sync(offsets)
+
+exercises = []
+for data in [first_page] + pages:
     for ex in data["results"]:
         # Extract name from translations (filter for English, language=2)
         name = None
@@ -60,10 +210,10 @@ while url:
             if trans.get("name"):
                 name = trans["name"].strip()
                 break
-        
+
         if not name:
             continue
-        
+
         slug = slugify(name)
         # Equipment is a list of objects in exerciseinfo
         equipment_list = ex.get("equipment", [])
@@ -74,8 +224,8 @@ while url:
             # Fallback: try to get equipment IDs if they're just numbers
             ids = equipment_list or []
             eq_names = [equip.get(eid, "none") for eid in ids if isinstance(eid, int)]
-        
-        eq_tokens = map_equipment(eq_names) if eq_names else ["bodyweight"]
+
+        eq_tokens = map_equipment(tuple(eq_names)) if eq_names else ["bodyweight"]
         exercises.append({
             "slug": slug,
             "name": name,
@@ -85,27 +235,54 @@ while url:
             "source_url": f"https://wger.de/en/exercise/{ex['id']}",
             "external_id": str(ex["id"]),
         })
-    url = data.get("next")
-    time.sleep(0.3)  # be polite
 
-# 4) Write CSV for Supabase import into staging_wger
+# 4) Write CSV for Supabase import into staging_wger.
+# pyarrow's CSV writer serializes whole columns in C++ without per-row Python
+# dispatch; the stdlib csv module stays as the fallback when pyarrow is missing.
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+
 csv_path = OUT / "staging_wger.csv"
-with csv_path.open("w", newline="", encoding="utf-8") as f:
-    w = csv.writer(f)
-    w.writerow(["slug","name","equipment","media_thumb","media_video","source_url","external_id"])
-    for ex in exercises:
-        # Supabase import: represent arrays as JSON or as Postgres array text. We'll use JSON then cast in merge.
-        w.writerow([
-            ex["slug"],
-            ex["name"],
-            json.dumps(ex["equipment_tokens"]),   # e.g. ["db","bench"]
-            ex["media_thumb"] or "",
-            ex["media_video"] or "",
-            ex["source_url"],
-            ex["external_id"],
-        ])
-
-print(f"Wrote {csv_path} with {len(exercises)} rows.")
+# Supabase import: represent arrays as JSON or as Postgres array text. We'll use JSON then cast in merge.
+columns = {
+    "slug": [ex["slug"] for ex in exercises],
+    "name": [ex["name"] for ex in exercises],
+    "equipment": [_dumps(ex["equipment_tokens"]) for ex in exercises],  # e.g. ["db","bench"]
+    "media_thumb": [ex["media_thumb"] or "" for ex in exercises],
+    "media_video": [ex["media_video"] or "" for ex in exercises],
+    "source_url": [ex["source_url"] for ex in exercises],
+    "external_id": [ex["external_id"] for ex in exercises],
+}
+
+if pa is not None:
+    table = pa.table(columns)
+    pa_csv.write_csv(table, csv_path, write_options=pa_csv.WriteOptions(include_header=True))
+else:
+    with csv_path.open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(list(columns))
+        w.writerows(zip(*columns.values()))
+
+log.info(f"Wrote {csv_path} with {len(exercises)} rows.")
+
+# 4b) Also emit Parquet when pyarrow is available: much faster to load than
+# CSV, zstd-compressed, and the equipment array survives as a native
+# list<string> instead of a JSON string that has to be cast during the merge.
+if pa is not None:
+    import pyarrow.parquet as pq
+    parquet_path = OUT / "staging_wger.parquet"
+    pq_columns = dict(columns)
+    pq_columns["equipment"] = pa.array(
+        [ex["equipment_tokens"] for ex in exercises], type=pa.list_(pa.string())
+    )
+    pq.write_table(
+        pa.table(pq_columns), parquet_path,
+        compression="zstd", use_dictionary=True,
+    )
+    log.info(f"Wrote {parquet_path} with {len(exercises)} rows.")
 
 # 5) Optional: generate a quick SQL you can use to create staging_wger
 sql = f"""
@@ -118,6 +295,12 @@ create table if not exists staging_wger (
   source_url text,
   external_id text
 );
+
+-- Fastest import path: upload staging_wger.parquet to Supabase Storage and
+-- COPY it server-side (pg_parquet / parquet_fdw). The equipment column is a
+-- native list<string> there, so no JSON cast is needed. The CSV stays as the
+-- compatibility path: import it and cast equipment from JSON text during the
+-- merge as before.
 """
 (Path(OUT/"create_staging_wger.sql")).write_text(sql)
-print("Wrote create_staging_wger.sql")
+log.info("Wrote create_staging_wger.sql")
@@ -0,0 +1,57 @@
+-- Server-side COPY path for usr/bin/import_new_exercise_library.py.
+--
+-- The importer's default path writes the parsed exercise rows as Parquet,
+-- uploads the file to the private 'imports' storage bucket, and calls the
+-- copy_exercises_from_parquet RPC below so Postgres ingests the rows in
+-- one server-side COPY instead of REST batches. If anything here is
+-- missing the script logs a warning and falls back to REST inserts, so
+-- this migration is an optimization, not a requirement.
+--
+-- Requires the pg_parquet extension (Supabase: Database → Extensions) and
+-- Postgres access to the storage S3 endpoint — see the Supabase pg_parquet
+-- docs for the S3 credential setup. The RPC is service-role only, so the
+-- importer must run with the service role key to use this path; with the
+-- anon key it fails fast and the script falls back to REST.
+--
+-- Run in Supabase Studio → SQL Editor on the project the importer's
+-- SUPABASE_URL points at.
+
+-- Private bucket the importer uploads Parquet files into. Never public;
+-- reads happen only inside the RPC.
+INSERT INTO storage.buckets (id, name, public)
+VALUES ('imports', 'imports', false)
+ON CONFLICT (id) DO NOTHING;
+
+CREATE EXTENSION IF NOT EXISTS pg_parquet;
+
+-- COPYs one uploaded Parquet file from the imports bucket into
+-- public.exercises and returns the number of rows loaded. SECURITY
+-- DEFINER so the COPY runs with owner rights; execute is granted to
+-- service_role only below.
+CREATE OR REPLACE FUNCTION public.copy_exercises_from_parquet(path TEXT)
+RETURNS BIGINT
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    inserted BIGINT;
+BEGIN
+    -- Only flat *.parquet names — nothing that could escape the bucket.
+    IF path !~ '^[A-Za-z0-9._-]+\.parquet$' THEN
+        RAISE EXCEPTION 'invalid parquet path: %', path;
+    END IF;
+
+    EXECUTE format(
+        'COPY public.exercises FROM %L WITH (format ''parquet'')',
+        's3://imports/' || path
+    );
+    GET DIAGNOSTICS inserted = ROW_COUNT;
+    RETURN inserted;
+END;
+$$;
+
+REVOKE ALL ON FUNCTION public.copy_exercises_from_parquet(TEXT)
+    FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.copy_exercises_from_parquet(TEXT)
+    TO service_role;
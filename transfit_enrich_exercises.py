@@ -1,10 +1,24 @@
+import asyncio
+import logging
 import os
 import json
+import re
+import sys
+from collections import defaultdict
+from functools import lru_cache
 from typing import List, Dict, Any
 
 from dotenv import load_dotenv
 from supabase import create_client, Client
-from openai import OpenAI
+from openai import AsyncOpenAI, RateLimitError
+
+# orjson decodes the model's JSON responses several times faster than
+# stdlib; stdlib json stays as a drop-in fallback
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
 
 # -------------------------
 # ENV + CLIENT SETUP
@@ -12,6 +26,9 @@ from openai import OpenAI
 
 load_dotenv()
 
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s", stream=sys.stderr)
+log = logging.getLogger(__name__)
+
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -21,11 +38,14 @@ assert SUPABASE_SERVICE_ROLE_KEY, "SUPABASE_SERVICE_ROLE_KEY not set"
 assert OPENAI_API_KEY, "OPENAI_API_KEY not set"
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
+openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
 
 # Safety limit while you test – set to None to process all
 MAX_EXERCISES = 25
 
+# OpenAI calls in flight at once; bounded to stay under rate limits
+CONCURRENCY = 8
+
 # Topic keywords used to tag research
 TOPIC_KEYWORDS = {
     "hrt_strength": [
@@ -47,24 +67,56 @@ TOPIC_KEYWORDS = {
 }
 
 
+# One automaton scans each text once instead of one substring search per
+# (topic, keyword) pair. pyahocorasick is used when installed; otherwise a
+# compiled regex alternation with one named group per topic does the same
+# single pass in C.
+try:
+    import ahocorasick
+
+    _TOPIC_AUTOMATON = ahocorasick.Automaton()
+    for _topic, _keywords in TOPIC_KEYWORDS.items():
+        for _kw in _keywords:
+            _TOPIC_AUTOMATON.add_word(_kw.lower(), _topic)
+    _TOPIC_AUTOMATON.make_automaton()
+
+    def _scan_topics(text: str) -> set:
+        return {topic for _, topic in _TOPIC_AUTOMATON.iter(text)}
+except ImportError:
+    _TOPIC_RX = re.compile(
+        "|".join(
+            f"(?P<{topic}>" + "|".join(re.escape(k.lower()) for k in keywords) + ")"
+            for topic, keywords in TOPIC_KEYWORDS.items()
+        )
+    )
+
+    def _scan_topics(text: str) -> set:
+        return {m.lastgroup for m in _TOPIC_RX.finditer(text)}
+
+
 # -------------------------
 # RESEARCH HELPERS
 # -------------------------
 
+@lru_cache(maxsize=8192)
+def _tag_topics_for_text(text: str) -> tuple:
+    """Keyword scan over one normalized text blob; memoized since titles and
+    takeaways repeat across re-runs of the tagging pass."""
+    found = _scan_topics(text)
+    # Preserve TOPIC_KEYWORDS ordering for stable output
+    return tuple(t for t in TOPIC_KEYWORDS if t in found)
+
+
 def tag_topics_for_research_row(row: Dict[str, Any]) -> List[str]:
     """Assign topic tags based on title + takeaways."""
     text = f"{row.get('title', '')} {row.get('takeaways', '')}".lower()
-    topics = []
-    for topic, keywords in TOPIC_KEYWORDS.items():
-        if any(k.lower() in text for k in keywords):
-            topics.append(topic)
-    return topics
+    return list(_tag_topics_for_text(text))
 
 
 def update_research_topics() -> List[Dict[str, Any]]:
     """
-    Fetches relevant research rows, tags topics, writes them back,
-    and returns a list of processed research rows.
+    Fetches relevant research rows, tags topics, writes all changes back in
+    one batched upsert, and returns a list of processed research rows.
     """
     resp = (
         supabase.table("transfit_research")
@@ -74,18 +126,23 @@ def update_research_topics() -> List[Dict[str, Any]]:
     )
     rows = resp.data or []
 
-    updated_rows = []
+    changes = []
     for row in rows:
         topics = tag_topics_for_research_row(row)
-        if topics and (row.get("topics") != topics):
-            supabase.table("transfit_research").update(
-                {"topics": topics, "processed": True}
-            ).eq("id", row["id"]).execute()
+        # Compare as sets so rows tagged in a different order by an older
+        # run don't generate a spurious upsert
+        if topics and (frozenset(row.get("topics") or []) != frozenset(topics)):
             row["topics"] = topics
             row["processed"] = True
-        updated_rows.append(row)
+            changes.append({"id": row["id"], "topics": topics, "processed": True})
 
-    return updated_rows
+    # One round trip per 500 changed rows instead of one PATCH per row
+    for i in range(0, len(changes), 500):
+        supabase.table("transfit_research").upsert(
+            changes[i : i + 500], on_conflict="id"
+        ).execute()
+
+    return rows
 
 
 # -------------------------
@@ -95,7 +152,33 @@ def update_research_topics() -> List[Dict[str, Any]]:
 def load_exercises() -> List[Dict[str, Any]]:
     """
     Loads exercises and joins in staging_exercisedb metadata by slug when available.
+
+    Prefers a server-side join via PostgREST embedding — one payload, no
+    Python join loop — and falls back to the old two-query client-side
+    join if the embedding isn't available (e.g. no FK between the tables).
     """
+    try:
+        ex_resp = (
+            supabase.table("exercises")
+            .select(
+                "id, slug, name, pattern, goal, difficulty, equipment, "
+                "binder_aware, pelvic_floor_safe, "
+                "staging_exercisedb(body_parts, exercise_type, target_muscles)"
+            )
+            .execute()
+        )
+        exercises = ex_resp.data or []
+        for ex in exercises:
+            s = ex.pop("staging_exercisedb", None) or {}
+            if isinstance(s, list):  # embedding may return a to-many list
+                s = s[0] if s else {}
+            ex["body_parts"] = s.get("body_parts")
+            ex["exercise_type"] = s.get("exercise_type")
+            ex["target_muscles"] = s.get("target_muscles")
+        return exercises
+    except Exception as e:
+        log.warning(f"Server-side join unavailable ({e}); joining client-side.")
+
     ex_resp = (
         supabase.table("exercises")
         .select(
@@ -164,23 +247,45 @@ def infer_topics_for_exercise(ex: Dict[str, Any]) -> List[str]:
     return list(topics)
 
 
-def build_research_context_for_topics(
+def build_topic_index(
     research_rows: List[Dict[str, Any]],
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Buckets research rows by topic so per-exercise lookup is O(topics)
+    instead of a scan over every research row. Buckets are sorted newest
+    first for deterministic context ordering.
+    """
+    by_topic = defaultdict(list)
+    for row in research_rows:
+        for topic in row.get("topics") or []:
+            by_topic[topic].append(row)
+    for rows in by_topic.values():
+        rows.sort(key=lambda r: r.get("year") or 0, reverse=True)
+    return by_topic
+
+
+def build_research_context_for_topics(
+    by_topic: Dict[str, List[Dict[str, Any]]],
     exercise_topics: List[str],
     max_articles: int = 6,
 ) -> (str, List[str]):
     """
-    Given a list of research rows and the exercise's topics,
+    Given the per-topic research index and the exercise's topics,
     return a formatted context string plus a list of DOIs.
     """
     if not exercise_topics:
         return "", []
 
     matched = []
-    for row in research_rows:
-        row_topics = row.get("topics") or []
-        if any(t in row_topics for t in exercise_topics):
+    seen = set()
+    for topic in exercise_topics:
+        for row in by_topic.get(topic, []):
+            if row["id"] in seen:
+                continue
+            seen.add(row["id"])
             matched.append(row)
+            if len(matched) >= max_articles:
+                break
         if len(matched) >= max_articles:
             break
 
@@ -208,22 +313,44 @@ def exercise_already_has_tips(exercise_id: int, population: str, context: str) -
     Check if we already generated tips for this exercise/population/context combo.
     Prevents duplicates when re-running the script.
     """
+    # limit(1) is a pure existence probe; count="exact" made Postgres
+    # count every matching row first
     resp = (
         supabase.table("exercise_trans_tips")
-        .select("id", count="exact")
+        .select("id")
         .eq("exercise_id", exercise_id)
         .eq("population", population)
         .eq("context", context)
+        .limit(1)
         .execute()
     )
-    return (resp.count or 0) > 0
+    return bool(resp.data)
 
 
 # -------------------------
 # OPENAI: TIP GENERATION
 # -------------------------
 
-def generate_tips_json_for_exercise(
+# pydantic v2 parses and validates the model's JSON against the expected
+# tip schema in one Rust-backed step, so malformed responses are caught
+# before they reach the database; without it we fall back to a raw parse
+try:
+    from pydantic import BaseModel, ValidationError
+
+    class Tips(BaseModel):
+        form_focus: List[str]
+        hrt_considerations: List[str]
+        binding_considerations: List[str]
+        post_op_considerations: List[str]
+        gender_affirming_modifications: List[str]
+        general_safety: List[str]
+        disclaimer: str
+        source_dois: List[str]
+except ImportError:
+    Tips = None
+
+
+async def generate_tips_json_for_exercise(
     exercise: Dict[str, Any],
     research_context: str,
     source_dois: List[str],
@@ -301,84 +428,137 @@ Rules:
 - Respond with ONLY the raw JSON, no explanation.
 """
 
-    response = openai_client.chat.completions.create(
-        model="gpt-4.1-mini",
-        messages=[
-            {"role": "system", "content": "You return only valid JSON objects."},
-            {"role": "user", "content": prompt},
-        ],
-        response_format={"type": "json_object"},
-        temperature=0,
-    )
+    for attempt in range(4):
+        try:
+            response = await openai_client.chat.completions.create(
+                model="gpt-4.1-mini",
+                messages=[
+                    {"role": "system", "content": "You return only valid JSON objects."},
+                    {"role": "user", "content": prompt},
+                ],
+                response_format={"type": "json_object"},
+                temperature=0,
+            )
+            break
+        except RateLimitError:
+            if attempt == 3:
+                raise
+            # Exponential back-off; enough to ride out a 429 burst when
+            # several requests are in flight at once
+            await asyncio.sleep(2 ** attempt)
 
     content = response.choices[0].message.content
-    return json.loads(content)
+    if Tips is not None:
+        try:
+            return Tips.model_validate_json(content).model_dump()
+        except ValidationError as e:
+            log.warning(
+                f"Tips for {exercise.get('name')} failed schema validation: {e}"
+            )
+            return {}
+    return _loads(content)
 
 
 # -------------------------
 # MAIN PIPELINE
 # -------------------------
 
+async def _generate_all(
+    pending: List[tuple], population: str, context: str
+) -> List[Dict[str, Any]]:
+    """
+    Runs tip generation for all pending exercises with CONCURRENCY calls in
+    flight and returns the exercise_trans_tips rows to insert.
+    """
+    sem = asyncio.Semaphore(CONCURRENCY)
+
+    async def run(ex, research_context, dois):
+        async with sem:
+            try:
+                tips_json = await generate_tips_json_for_exercise(
+                    ex, research_context, dois
+                )
+            except Exception as e:
+                log.warning(f"Error generating tips for {ex['name']}: {e}")
+                return None
+            if not tips_json:
+                log.debug(f"No tips generated for {ex['name']}, skipping.")
+                return None
+            log.info(f"Generated tips for {ex['name']} (id {ex['id']}).")
+            return {
+                "exercise_id": ex["id"],
+                "population": population,
+                "context": context,
+                "tips": tips_json,
+                "source_dois": dois,
+                "needs_review": True,
+            }
+
+    results = await asyncio.gather(*(run(*item) for item in pending))
+    return [r for r in results if r is not None]
+
+
 def main():
-    print("Loading and tagging research...")
+    log.info("Loading and tagging research...")
     research_rows = update_research_topics()
-    print(f"Loaded {len(research_rows)} research rows.")
+    by_topic = build_topic_index(research_rows)
+    log.info(f"Loaded {len(research_rows)} research rows.")
 
-    print("Loading exercises and staging metadata...")
+    log.info("Loading exercises and staging metadata...")
     exercises = load_exercises()
-    print(f"Loaded {len(exercises)} exercises.")
+    log.info(f"Loaded {len(exercises)} exercises.")
 
-    processed_count = 0
     population = "general"
     context = "general"
 
+    # Prefetch which exercises already have tips for this population/context:
+    # one query instead of an existence probe (and a network round trip) per
+    # exercise in the loop below
+    existing_resp = (
+        supabase.table("exercise_trans_tips")
+        .select("exercise_id")
+        .eq("population", population)
+        .eq("context", context)
+        .execute()
+    )
+    existing_tip_ids = {r["exercise_id"] for r in (existing_resp.data or [])}
+
+    # Filter and build contexts up front (cheap, local), then run the
+    # multi-second OpenAI calls concurrently instead of one at a time.
+    pending = []
     for ex in exercises:
-        if MAX_EXERCISES is not None and processed_count >= MAX_EXERCISES:
+        if MAX_EXERCISES is not None and len(pending) >= MAX_EXERCISES:
             break
 
         exercise_id = ex["id"]
 
-        if exercise_already_has_tips(exercise_id, population, context):
-            print(f"Skipping {ex['name']} (existing tips).")
+        if exercise_id in existing_tip_ids:
+            log.debug(f"Skipping {ex['name']} (existing tips).")
             continue
 
         ex_topics = infer_topics_for_exercise(ex)
         if not ex_topics:
-            print(f"No topics inferred for {ex['name']}, skipping.")
+            log.debug(f"No topics inferred for {ex['name']}, skipping.")
             continue
 
         research_context, dois = build_research_context_for_topics(
-            research_rows, ex_topics
+            by_topic, ex_topics
         )
         if not research_context:
-            print(f"No matching research for topics {ex_topics} on {ex['name']}, skipping.")
+            log.debug(f"No matching research for topics {ex_topics} on {ex['name']}, skipping.")
             continue
 
-        try:
-            tips_json = generate_tips_json_for_exercise(ex, research_context, dois)
-        except Exception as e:
-            print(f"Error generating tips for {ex['name']}: {e}")
-            continue
+        pending.append((ex, research_context, dois))
 
-        if not tips_json:
-            print(f"No tips generated for {ex['name']}, skipping.")
-            continue
-
-        supabase.table("exercise_trans_tips").insert(
-            {
-                "exercise_id": exercise_id,
-                "population": population,
-                "context": context,
-                "tips": tips_json,
-                "source_dois": dois,
-                "needs_review": True,
-            }
-        ).execute()
+    rows = asyncio.run(_generate_all(pending, population, context))
 
-        processed_count += 1
-        print(f"Inserted tips for {ex['name']} (id {exercise_id}).")
+    # Batched inserts instead of a round trip per exercise
+    for i in range(0, len(rows), 500):
+        supabase.table("exercise_trans_tips").insert(rows[i : i + 500]).execute()
+    existing_tip_ids.update(r["exercise_id"] for r in rows)
 
-    print(f"Done. Generated tips for {processed_count} exercises.")
+    processed_count = len(rows)
+    log.info(f"Done. Generated tips for {processed_count} exercises.")
 
 
 if __name__ == "__main__":
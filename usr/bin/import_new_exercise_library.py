@@ -6,45 +6,90 @@ Converts Python list syntax ['item'] to JSON array
 Handles all new fields and proper data types
 """
 
+import ast
+import asyncio
 import csv
 import json
+import logging
 import os
 import sys
+import tempfile
+import time
+from functools import lru_cache
 from typing import Any, Optional
 from supabase import create_client, Client
 
+# pyarrow parses the CSV with a multithreaded C++ reader and typed columns;
+# the stdlib csv module stays as the fallback when it isn't installed
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+
+# httpx (already a supabase-py dependency) lets the REST fallback post
+# batches concurrently instead of one request at a time
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# orjson serializes the insert payloads several times faster than stdlib;
+# stdlib json stays as a drop-in fallback
+try:
+    import orjson
+    _dumps_bytes = orjson.dumps
+except ImportError:
+    _dumps_bytes = lambda obj: json.dumps(obj).encode()
+
+# PostgREST handles far larger batches than 50; bigger payloads amortize
+# the per-request overhead
+BATCH_SIZE = 1000
+INSERT_CONCURRENCY = 8
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s", stream=sys.stderr)
+log = logging.getLogger(__name__)
+
+@lru_cache(maxsize=1024)
+def _parse_python_list(value: str) -> tuple[str, ...]:
+    try:
+        result = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        # Not a valid literal — fall back to the old manual split
+        return tuple(
+            item.strip().strip("'\"")
+            for item in value.strip('[]').split(',')
+            if item.strip().strip("'\"")
+        )
+    if isinstance(result, (list, tuple)):
+        return tuple(str(x).strip() for x in result)
+    return (str(result).strip(),)
+
 def parse_python_list(value: str) -> list[str]:
     """
     Convert Python list syntax to Python list
     ['bodyweight'] -> ['bodyweight']
     ['dumbbells', 'bench'] -> ['dumbbells', 'bench']
+
+    Parsed with ast.literal_eval so commas inside quoted items survive;
+    results are memoized since values like ['bodyweight'] repeat heavily.
     """
     if not value or value.strip() == '' or value.strip() == '[]':
         return []
-    
-    value = value.strip()
-    
-    # Remove outer brackets
-    if value.startswith('[') and value.endswith(']'):
-        value = value[1:-1]
-    
-    # Split by comma and clean each item
-    items = []
-    for item in value.split(','):
-        item = item.strip().strip("'\"")
-        if item:
-            items.append(item)
-    
-    return items
+    return list(_parse_python_list(value.strip()))
 
-def parse_boolean(value: str) -> bool:
-    """Convert TRUE/FALSE strings to boolean"""
+def parse_boolean(value: Any) -> bool:
+    """Convert TRUE/FALSE strings (or an already-typed bool) to boolean"""
+    if isinstance(value, bool):
+        return value
     if not value:
         return False
     return value.strip().upper() in ('TRUE', '1', 'YES')
 
-def parse_int_or_none(value: str) -> Optional[int]:
-    """Parse integer or return None if empty"""
+def parse_int_or_none(value: Any) -> Optional[int]:
+    """Parse integer or return None if empty (passes through typed ints)"""
+    if isinstance(value, int):
+        return value
     if not value or value.strip() == '':
         return None
     try:
@@ -58,7 +103,39 @@ def parse_text_or_none(value: str) -> Optional[str]:
         return None
     return value.strip()
 
-def row_to_exercise(row: dict[str, str]) -> dict[str, Any]:
+def read_csv_rows(csv_path: str) -> list[dict[str, Any]]:
+    """
+    Read the CSV into a list of row dicts.
+
+    With pyarrow installed the parse runs in C++ (columnar, multithreaded,
+    int/bool columns typed up front); otherwise fall back to csv.DictReader.
+    Either way each row dict feeds row_to_exercise unchanged.
+    """
+    if pa is not None:
+        convert_options = pa_csv.ConvertOptions(
+            column_types={
+                'id': pa.int64(),
+                'post_op_safe_weeks': pa.int64(),
+                'effectiveness_rating': pa.int64(),
+                'binder_aware': pa.bool_(),
+                'pelvic_floor_safe': pa.bool_(),
+                'heavy_binding_safe': pa.bool_(),
+                'flags_reviewed': pa.bool_(),
+                # Keep these as strings: inference would type them as
+                # timestamp/int64, and row_to_exercise (and the stdlib
+                # json fallback) expects the DictReader string shape
+                'created_at': pa.string(),
+                'version': pa.string(),
+            },
+            strings_can_be_null=True,
+        )
+        table = pa_csv.read_csv(csv_path, convert_options=convert_options)
+        return table.to_pylist()
+
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+def row_to_exercise(row: dict[str, Any]) -> dict[str, Any]:
     """Convert CSV row to exercise dict"""
     return {
         'id': int(row['id']),
@@ -103,50 +180,91 @@ def row_to_exercise(row: dict[str, str]) -> dict[str, Any]:
         'reviewer': parse_text_or_none(row['reviewer']),
     }
 
-def import_exercises(csv_path: str, supabase: Client, dry_run: bool = False):
+def import_via_copy(exercises: list[dict[str, Any]], supabase: Client) -> bool:
+    """
+    Bulk-load path: write the parsed rows as Parquet, upload to the
+    'imports' storage bucket, and have Postgres COPY them server-side via
+    the copy_exercises_from_parquet RPC — one upload and one COPY instead
+    of a REST round trip per batch. Returns False if any step fails so the
+    caller can fall back to REST inserts.
+
+    Server-side setup (bucket, RPC, pg_parquet) lives in
+    supabase/migrations/003_copy_exercises_from_parquet.sql; the RPC is
+    service-role only, so run the importer with the service role key to
+    use this path.
+    """
+    if pa is None:
+        return False
+
+    import pyarrow.parquet as pq
+
+    parquet_path = None
+    try:
+        table = pa.Table.from_pylist(exercises)
+        with tempfile.NamedTemporaryFile(suffix='.parquet', delete=False) as tmp:
+            parquet_path = tmp.name
+        pq.write_table(table, parquet_path, compression='zstd')
+
+        storage_path = f"exercises_{int(time.time())}.parquet"
+        with open(parquet_path, 'rb') as f:
+            supabase.storage.from_('imports').upload(storage_path, f)
+        supabase.rpc(
+            'copy_exercises_from_parquet', {'path': storage_path}
+        ).execute()
+        log.info(f"🎉 COPY import completed: {len(exercises)} exercises via {storage_path}")
+        return True
+    except Exception as e:
+        log.warning(f"⚠️  COPY path failed ({str(e)}); falling back to REST inserts")
+        return False
+    finally:
+        if parquet_path and os.path.exists(parquet_path):
+            os.unlink(parquet_path)
+
+def import_exercises(csv_path: str, supabase: Client, dry_run: bool = False,
+                     use_rest: bool = False, no_async: bool = False):
     """Import exercises from CSV to Supabase"""
     
     exercises = []
     errors = []
     
-    print(f"📖 Reading CSV from: {csv_path}")
+    log.info(f"📖 Reading CSV from: {csv_path}")
     
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        
-        for i, row in enumerate(reader, start=2):  # Start at 2 (row 1 is header)
-            try:
-                exercise = row_to_exercise(row)
-                exercises.append(exercise)
-                
-                # Print sample for verification
-                if i <= 3:
-                    print(f"\n📋 Row {i} preview:")
-                    print(f"   Name: {exercise['name']}")
-                    print(f"   Equipment: {exercise['equipment']}")
-                    print(f"   Gender emphasis: {exercise['gender_goal_emphasis']}")
-                    print(f"   Contraindications: {exercise['contraindications']}")
-                
-            except Exception as e:
-                error_msg = f"Row {i} ({row.get('name', 'unknown')}): {str(e)}"
-                errors.append(error_msg)
-                print(f"❌ {error_msg}")
-    
-    print(f"\n✅ Parsed {len(exercises)} exercises from CSV")
+    rows = read_csv_rows(csv_path)
+    
+    for i, row in enumerate(rows, start=2):  # Start at 2 (row 1 is header)
+        try:
+            exercise = row_to_exercise(row)
+            exercises.append(exercise)
+            
+            # Sample rows for verification; debug-only so large imports
+            # don't pay per-row formatting/flush cost
+            if i <= 3 and log.isEnabledFor(logging.DEBUG):
+                log.debug(f"📋 Row {i} preview:")
+                log.debug(f"   Name: {exercise['name']}")
+                log.debug(f"   Equipment: {exercise['equipment']}")
+                log.debug(f"   Gender emphasis: {exercise['gender_goal_emphasis']}")
+                log.debug(f"   Contraindications: {exercise['contraindications']}")
+            
+        except Exception as e:
+            error_msg = f"Row {i} ({row.get('name', 'unknown')}): {str(e)}"
+            errors.append(error_msg)
+            log.error(f"❌ {error_msg}")
+    
+    log.info(f"✅ Parsed {len(exercises)} exercises from CSV")
     
     if errors:
-        print(f"\n⚠️  {len(errors)} errors encountered:")
+        log.warning(f"⚠️  {len(errors)} errors encountered:")
         for error in errors:
-            print(f"   - {error}")
+            log.warning(f"   - {error}")
         
         response = input("\nContinue with import? (y/n): ")
         if response.lower() != 'y':
-            print("❌ Import cancelled")
+            log.info("❌ Import cancelled")
             return
     
     if dry_run:
-        print("\n🔍 DRY RUN - No data will be inserted")
-        print(f"   Would insert {len(exercises)} exercises")
+        log.info("🔍 DRY RUN - No data will be inserted")
+        log.info(f"   Would insert {len(exercises)} exercises")
         
         # Show equipment distribution
         from collections import Counter
@@ -155,58 +273,113 @@ def import_exercises(csv_path: str, supabase: Client, dry_run: bool = False):
             for eq in ex['equipment']:
                 equipment_counts[eq] += 1
         
-        print("\n📊 Equipment distribution:")
+        log.info("📊 Equipment distribution:")
         for eq, count in equipment_counts.most_common():
-            print(f"   {eq}: {count} exercises")
+            log.info(f"   {eq}: {count} exercises")
         
         return
     
     # Confirm before inserting
-    print(f"\n⚠️  About to insert {len(exercises)} exercises into Supabase")
+    log.warning(f"⚠️  About to insert {len(exercises)} exercises into Supabase")
     response = input("This will replace existing data. Continue? (yes/no): ")
     if response.lower() != 'yes':
-        print("❌ Import cancelled")
+        log.info("❌ Import cancelled")
         return
     
-    # Insert in batches
-    batch_size = 50
+    if not use_rest and import_via_copy(exercises, supabase):
+        inserted_count = len(exercises)
+    else:
+        inserted_count = insert_via_rest(exercises, supabase, no_async)
+    
+    log.info(f"🎉 Successfully imported {inserted_count} exercises!")
+    
+    # Verify counts
+    count_result = supabase.table('exercises').select('id', count='exact').execute()
+    db_count = count_result.count
+    log.info(f"✅ Verified {db_count} exercises in database")
+
+async def _insert_batches_async(exercises: list[dict[str, Any]],
+                                url: str, key: str) -> int:
+    """POST batches straight to PostgREST with INSERT_CONCURRENCY requests
+    in flight; 5xx responses retry with exponential back-off."""
+    sem = asyncio.Semaphore(INSERT_CONCURRENCY)
+    headers = {
+        'apikey': key,
+        'Authorization': f'Bearer {key}',
+        'Content-Type': 'application/json',
+        'Prefer': 'return=minimal',
+    }
+    batches = [exercises[i:i+BATCH_SIZE]
+               for i in range(0, len(exercises), BATCH_SIZE)]
+    
+    async def send(client, n, batch):
+        async with sem:
+            for attempt in range(4):
+                resp = await client.post('/rest/v1/exercises',
+                                         content=_dumps_bytes(batch))
+                if resp.status_code < 500:
+                    break
+                await asyncio.sleep(2 ** attempt)
+            resp.raise_for_status()
+            log.debug(f"✅ Inserted batch {n}: {len(batch)} exercises")
+            return len(batch)
+    
+    async with httpx.AsyncClient(base_url=url, headers=headers,
+                                 timeout=60) as client:
+        counts = await asyncio.gather(
+            *[send(client, n, b) for n, b in enumerate(batches, start=1)]
+        )
+    return sum(counts)
+
+def insert_via_rest(exercises: list[dict[str, Any]], supabase: Client,
+                    no_async: bool = False) -> int:
+    """Insert exercises through the REST API in batches"""
+    url = os.environ.get("SUPABASE_URL")
+    key = os.environ.get("SUPABASE_ANON_KEY")
+    
+    if not no_async and httpx is not None and url and key:
+        return asyncio.run(_insert_batches_async(exercises, url, key))
+    
+    # Sync fallback: one supabase-py insert per batch
     inserted_count = 0
     
-    for i in range(0, len(exercises), batch_size):
-        batch = exercises[i:i+batch_size]
+    for i in range(0, len(exercises), BATCH_SIZE):
+        batch = exercises[i:i+BATCH_SIZE]
         
+        batch_num = i//BATCH_SIZE + 1
         try:
             result = supabase.table('exercises').insert(batch).execute()
             inserted_count += len(batch)
-            print(f"✅ Inserted batch {i//batch_size + 1}: {len(batch)} exercises (total: {inserted_count})")
+            # Summarize every 10 batches instead of logging each one
+            if batch_num % 10 == 0:
+                log.info(f"✅ Inserted {inserted_count} exercises through batch {batch_num}")
         except Exception as e:
-            print(f"❌ Error inserting batch {i//batch_size + 1}: {str(e)}")
-            print(f"   First exercise in batch: {batch[0]['name']}")
+            log.error(f"❌ Error inserting batch {batch_num}: {str(e)}")
+            log.error(f"   First exercise in batch: {batch[0]['name']}")
             raise
     
-    print(f"\n🎉 Successfully imported {inserted_count} exercises!")
-    
-    # Verify counts
-    count_result = supabase.table('exercises').select('id', count='exact').execute()
-    db_count = count_result.count
-    print(f"✅ Verified {db_count} exercises in database")
+    return inserted_count
 
 def main():
     """Main entry point"""
     
     # Check arguments
     if len(sys.argv) < 2:
-        print("Usage: python import_new_exercise_library.py <csv_path> [--dry-run]")
+        print("Usage: python import_new_exercise_library.py <csv_path> [--dry-run] [--rest] [--no-async]")
         print("\nOptions:")
         print("  --dry-run    Parse CSV but don't insert to database")
+        print("  --rest       Skip the storage COPY path and use REST batch inserts")
+        print("  --no-async   Send REST batches one at a time")
         sys.exit(1)
     
     csv_path = sys.argv[1]
     dry_run = '--dry-run' in sys.argv
+    use_rest = '--rest' in sys.argv
+    no_async = '--no-async' in sys.argv
     
     # Check file exists
     if not os.path.exists(csv_path):
-        print(f"❌ Error: File not found: {csv_path}")
+        log.error(f"❌ Error: File not found: {csv_path}")
         sys.exit(1)
     
     # Get Supabase credentials
@@ -214,27 +387,25 @@ def main():
     key = os.environ.get("SUPABASE_ANON_KEY")
     
     if not url or not key:
-        print("❌ Error: SUPABASE_URL and SUPABASE_ANON_KEY environment variables required")
-        print("\nSet them like this:")
-        print("  export SUPABASE_URL='https://your-project.supabase.co'")
-        print("  export SUPABASE_ANON_KEY='your-anon-key'")
+        log.error("❌ Error: SUPABASE_URL and SUPABASE_ANON_KEY environment variables required")
+        log.error("Set them like this:")
+        log.error("  export SUPABASE_URL='https://your-project.supabase.co'")
+        log.error("  export SUPABASE_ANON_KEY='your-anon-key'")
         sys.exit(1)
     
     # Initialize Supabase client
     try:
         supabase: Client = create_client(url, key)
-        print("✅ Connected to Supabase")
+        log.info("✅ Connected to Supabase")
     except Exception as e:
-        print(f"❌ Error connecting to Supabase: {str(e)}")
+        log.error(f"❌ Error connecting to Supabase: {str(e)}")
         sys.exit(1)
     
     # Run import
     try:
-        import_exercises(csv_path, supabase, dry_run)
+        import_exercises(csv_path, supabase, dry_run, use_rest, no_async)
     except Exception as e:
-        print(f"\n❌ Import failed: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.error(f"❌ Import failed: {str(e)}", exc_info=True)
         sys.exit(1)
 
 if __name__ == '__main__':